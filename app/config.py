@@ -1,48 +1,45 @@
 """
 Configuration Management for RAG System
 """
-import os
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
-from pydantic_settings import BaseSettings
-from dotenv import load_dotenv
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
-# Load environment variables
-load_dotenv()
 
 class Settings(BaseSettings):
     """Application settings from environment variables"""
     
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=False)
+    
     # Azure OpenAI Configuration
-    azure_openai_endpoint: str = os.getenv("AZURE_OPENAI_ENDPOINT", "")
-    azure_openai_api_key: str = os.getenv("AZURE_OPENAI_API_KEY", "")
-    azure_openai_deployment_name: str = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4")
-    azure_openai_api_version: str = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
-    azure_openai_embedding_deployment: str = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-ada-002")
+    azure_openai_endpoint: str = ""
+    azure_openai_api_key: str = ""
+    azure_openai_deployment_name: str = "gpt-4"
+    azure_openai_api_version: str = "2024-02-15-preview"
+    azure_openai_embedding_deployment: str = "text-embedding-ada-002"
     
     # Azure AI Search Configuration
-    azure_search_endpoint: str = os.getenv("AZURE_SEARCH_ENDPOINT", "")
-    azure_search_api_key: str = os.getenv("AZURE_SEARCH_API_KEY", "")
-    azure_search_index_name: str = os.getenv("AZURE_SEARCH_INDEX_NAME", "documents-index")
+    azure_search_endpoint: str = ""
+    azure_search_api_key: str = ""
+    azure_search_index_name: str = "documents-index"
     
     # Document Configuration
-    document_path: str = os.getenv("DOCUMENT_PATH", r"C:\Users\rajvkha\Downloads\DocumentQnA_RAG_DataSet\sample_docs")
-    chunk_size: int = int(os.getenv("CHUNK_SIZE", "1000"))
-    chunk_overlap: int = int(os.getenv("CHUNK_OVERLAP", "200"))
+    document_path: str = r"C:\Users\rajvkha\Downloads\DocumentQnA_RAG_DataSet\sample_docs"
+    chunk_size: int = 1000
+    chunk_overlap: int = 200
+    encoding_cache_path: Optional[str] = None  # Defaults to .enc_cache.json beside the app
     
     # Application Configuration
-    app_host: str = os.getenv("APP_HOST", "0.0.0.0")
-    app_port: int = int(os.getenv("APP_PORT", "8000"))
-    debug: bool = os.getenv("DEBUG", "True").lower() == "true"
+    app_host: str = "0.0.0.0"
+    app_port: int = 8000
+    debug: bool = True
     
     # Additional settings
     max_tokens: int = 1500
     temperature: float = 0.7
     top_k_results: int = 5
-    
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
+    query_cache_size: int = 256
     
     def validate_azure_config(self) -> bool:
         """Validate Azure configuration"""
@@ -58,5 +55,8 @@ class Settings(BaseSettings):
         """Get document path as Path object"""
         return Path(self.document_path)
 
-# Global settings instance
-settings = Settings()
+
+@lru_cache
+def get_settings() -> Settings:
+    """Get the application settings, loaded from the environment once"""
+    return Settings()
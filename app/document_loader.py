@@ -3,131 +3,345 @@ Document Loading and Processing Module
 Supports multiple document formats: PDF, DOCX, TXT, MD
 """
 import os
+import json
+import mmap
+import hashlib
+import zipfile
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterator, Optional, Tuple
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import logging
 
 # Document parsing libraries
-from pypdf import PdfReader
-from docx import Document
-import chardet
+from lxml import etree
+
+# PyMuPDF is a C-backed extractor and much faster than pypdf, which stays
+# available as the fallback
+try:
+    import fitz
+except ImportError:
+    fitz = None
+    from pypdf import PdfReader
+
+# Prefer the C implementation of chardet; charset_normalizer exposes the
+# same detect() contract and is the pure-Python fallback
+try:
+    import cchardet as chardet
+    from cchardet import UniversalDetector
+except ImportError:
+    import charset_normalizer as chardet
+    UniversalDetector = None
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# WordprocessingML namespace used in DOCX document.xml
+_W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+# Run-level elements that stand for whitespace rather than carrying text
+_RUN_CONTENT = {
+    f'{_W_NS}tab': '\t',
+    f'{_W_NS}br': '\n',
+    f'{_W_NS}cr': '\n'
+}
+
 
 class DocumentLoader:
     """Load and parse various document formats"""
     
     SUPPORTED_EXTENSIONS = {'.pdf', '.txt', '.md', '.docx'}
+    TEXT_EXTENSIONS = {'.txt', '.md'}
+    DETECTION_CHUNK_SIZE = 8192
+    DETECTION_SAMPLE_SIZE = 1 << 16
+    HASH_BLOCK_SIZE = 1 << 20
+    # Kept with the application rather than in the (read-only) document folder
+    ENCODING_CACHE_FILE = Path(__file__).resolve().parent.parent / ".enc_cache.json"
+    ENCODING_CACHE_SIZE = 10000
     
-    def __init__(self, document_path: str):
+    def __init__(self, document_path: str, max_workers: Optional[int] = None,
+                 encoding_cache_path: Optional[str] = None):
         """
         Initialize document loader
         
         Args:
             document_path: Path to documents directory
+            max_workers: Number of worker processes used to parse documents
+                (defaults to the CPU count)
+            encoding_cache_path: File that stores detected text encodings
+                (defaults to ENCODING_CACHE_FILE)
         """
         self.document_path = Path(document_path)
+        self.max_workers = max_workers
         
         if not self.document_path.exists():
             raise FileNotFoundError(f"Document path not found: {document_path}")
+        
+        # Detected text encodings keyed by path, mtime and size
+        self._encoding_cache_path = Path(encoding_cache_path or self.ENCODING_CACHE_FILE)
+        self._encoding_cache = self._read_encoding_cache()
     
     def load_all_documents(self) -> List[Dict[str, str]]:
         """
         Load all supported documents from the directory
         
         Returns:
-            List of document dictionaries with content and metadata
+            List of document dictionaries with text fragments and metadata
         """
-        documents = []
-        
-        for file_path in self.document_path.rglob("*"):
-            if file_path.is_file() and file_path.suffix.lower() in self.SUPPORTED_EXTENSIONS:
-                try:
-                    doc_data = self.load_single_document(file_path)
-                    if doc_data:
-                        documents.append(doc_data)
-                        logger.info(f"Loaded: {file_path.name}")
-                except Exception as e:
-                    logger.error(f"Error loading {file_path.name}: {str(e)}")
+        # Stat once during the walk; DirEntry objects are not picklable, so
+        # hand workers the path and size instead
+        entries = []
+        stats = []
+        for entry in self._iter_document_entries(self.document_path):
+            try:
+                stats.append(entry.stat())
+            except OSError as e:
+                # Removed or made unreadable since the walk; skip just this file
+                logger.warning(f"Skipping {entry.path}: {str(e)}")
+                continue
+            entries.append(entry)
+        file_paths = [Path(entry.path) for entry in entries]
+        file_sizes = [stat.st_size for stat in stats]
+        cache_keys = [
+            f"{entry.path}|{stat.st_mtime_ns}|{stat.st_size}"
+            for entry, stat in zip(entries, stats)
+        ]
+        encodings = [self._encoding_cache.get(key) for key in cache_keys]
+        
+        # Parsing is CPU-bound and independent per file, so fan out to processes
+        if len(file_paths) > 1 and self.max_workers != 1:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                results = list(executor.map(
+                    _load_document_task, file_paths, file_sizes, encodings, chunksize=4
+                ))
+        else:
+            results = [
+                _load_document_task(file_path, file_size, encoding)
+                for file_path, file_size, encoding in zip(file_paths, file_sizes, encodings)
+            ]
+        
+        # Workers report encodings they had to detect; remember new ones for next time
+        added = False
+        for key, doc_data in zip(cache_keys, results):
+            if not (doc_data and doc_data['encoding']):
+                continue
+            if key not in self._encoding_cache:
+                added = True
+            self._encoding_cache[key] = doc_data['encoding']
+            self._encoding_cache.move_to_end(key)
+        
+        if added:
+            while len(self._encoding_cache) > self.ENCODING_CACHE_SIZE:
+                self._encoding_cache.popitem(last=False)
+            self._write_encoding_cache()
+        
+        documents = [doc_data for doc_data in results if doc_data]
         
         logger.info(f"Total documents loaded: {len(documents)}")
         return documents
     
-    def load_single_document(self, file_path: Path) -> Optional[Dict[str, str]]:
+    def _read_encoding_cache(self) -> OrderedDict:
+        """Load the on-disk encoding cache, starting empty if unavailable"""
+        try:
+            with open(self._encoding_cache_path, 'r', encoding='utf-8') as f:
+                return OrderedDict(json.load(f))
+        except (OSError, ValueError):
+            return OrderedDict()
+    
+    def _write_encoding_cache(self):
+        """Persist the encoding cache; failures only cost re-detection"""
+        try:
+            with open(self._encoding_cache_path, 'w', encoding='utf-8') as f:
+                json.dump(self._encoding_cache, f)
+        except OSError as e:
+            logger.warning(f"Could not write encoding cache: {str(e)}")
+    
+    @classmethod
+    def _iter_document_entries(cls, root) -> Iterator[os.DirEntry]:
+        """Recursively yield directory entries for supported files"""
+        try:
+            it = os.scandir(root)
+        except OSError as e:
+            # Unreadable folders are skipped rather than failing the whole load
+            logger.warning(f"Skipping directory {root}: {str(e)}")
+            return
+        
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from cls._iter_document_entries(entry.path)
+                elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in cls.SUPPORTED_EXTENSIONS:
+                    yield entry
+    
+    @classmethod
+    def load_single_document(cls, file_path: Path,
+                             file_size: Optional[int] = None,
+                             encoding: Optional[str] = None) -> Optional[Dict[str, str]]:
         """
         Load a single document based on its extension
         
         Args:
             file_path: Path to the document
+            file_size: Size in bytes if already known, to avoid another stat
+            encoding: Previously detected encoding for text files, if known
             
         Returns:
-            Dictionary with content and metadata
+            Dictionary with text fragments (pages, paragraphs or the whole
+            file) and metadata
         """
         extension = file_path.suffix.lower()
         
         loaders = {
-            '.pdf': self._load_pdf,
-            '.txt': self._load_text,
-            '.md': self._load_text,
-            '.docx': self._load_docx
+            '.pdf': cls._load_pdf,
+            '.docx': cls._load_docx
         }
         
-        loader_func = loaders.get(extension)
-        if not loader_func:
+        if extension in cls.TEXT_EXTENSIONS:
+            fragments, encoding = cls._load_text(file_path, encoding)
+        elif extension in loaders:
+            fragments = loaders[extension](file_path)
+            encoding = None
+        else:
             return None
         
-        content = loader_func(file_path)
-        
-        if content:
+        if fragments:
             return {
-                'content': content,
+                'fragments': fragments,
                 'source': str(file_path.name),
                 'file_path': str(file_path),
                 'file_type': extension[1:],  # Remove the dot
-                'file_size': file_path.stat().st_size
+                'file_size': file_size if file_size is not None else file_path.stat().st_size,
+                'file_hash': cls._hash_file(file_path),
+                'encoding': encoding
             }
         
         return None
     
-    def _load_pdf(self, file_path: Path) -> str:
-        """Load PDF document"""
+    @classmethod
+    def _hash_file(cls, file_path: Path) -> str:
+        """Compute a content hash used to detect unchanged files on re-ingest"""
+        digest = hashlib.blake2b()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(cls.HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _load_pdf(file_path: Path) -> List[str]:
+        """Load PDF document as one fragment per page"""
         try:
-            reader = PdfReader(str(file_path))
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text.strip()
+            if fitz is not None:
+                with fitz.open(str(file_path)) as doc:
+                    pages = [page.get_text() for page in doc]
+            else:
+                reader = PdfReader(str(file_path))
+                pages = [page.extract_text() or "" for page in reader.pages]
+            return [text.strip() for text in pages if text.strip()]
         except Exception as e:
             logger.error(f"Error reading PDF {file_path.name}: {str(e)}")
-            return ""
+            return []
     
-    def _load_text(self, file_path: Path) -> str:
-        """Load text or markdown file"""
+    @classmethod
+    def _load_text(cls, file_path: Path,
+                   encoding: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+        """Load text or markdown file as a single fragment, with its detected encoding"""
         try:
-            # Detect encoding
             with open(file_path, 'rb') as f:
-                raw_data = f.read()
-                result = chardet.detect(raw_data)
-                encoding = result['encoding'] or 'utf-8'
+                if os.fstat(f.fileno()).st_size == 0:
+                    return [], None
+                
+                # Decode straight from the mapping rather than copying the file
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if encoding:
+                        text = str(mm, encoding)
+                    else:
+                        text, encoding = cls._decode(mm)
             
-            # Read with detected encoding
-            with open(file_path, 'r', encoding=encoding) as f:
-                return f.read().strip()
+            # Normalize newlines like text-mode open()
+            text = text.replace('\r\n', '\n').replace('\r', '\n').strip()
+            return ([text] if text else []), encoding
         except Exception as e:
             logger.error(f"Error reading text file {file_path.name}: {str(e)}")
-            return ""
+            return [], None
+    
+    @classmethod
+    def _decode(cls, data) -> Tuple[str, Optional[str]]:
+        """
+        Decode a bytes-like object, trying BOMs and UTF-8 before chardet
+        
+        Returns the text and the detected encoding, or None when a BOM or
+        UTF-8 decoded it directly, since those are cheap to find again.
+        """
+        if data[:3] == b'\xef\xbb\xbf':
+            return str(data, 'utf-8-sig'), None
+        if data[:2] in (b'\xff\xfe', b'\xfe\xff'):
+            return str(data, 'utf-16'), None
+        
+        try:
+            return str(data, 'utf-8'), None
+        except UnicodeDecodeError:
+            pass
+        
+        encoding = cls._detect_encoding(data)
+        try:
+            return str(data, encoding), encoding
+        except (UnicodeDecodeError, LookupError):
+            # A wrong guess should cost a few characters, not the document
+            logger.warning(f"Could not decode as {encoding}; replacing undecodable bytes")
+            return str(data, encoding, errors='replace'), encoding
+    
+    @classmethod
+    def _detect_encoding(cls, data) -> str:
+        """Detect the encoding of a bytes-like object with chardet"""
+        if UniversalDetector is None:
+            # No incremental detector available: sample a bounded prefix
+            # rather than copying the whole mapping into memory
+            encoding = chardet.detect(bytes(data[:cls.DETECTION_SAMPLE_SIZE]))['encoding']
+            
+            # UTF-8 has already failed, so an ASCII prefix only means the
+            # non-ASCII bytes come later; detect over the whole file instead
+            if (not encoding or encoding.lower() == 'ascii') and len(data) > cls.DETECTION_SAMPLE_SIZE:
+                encoding = chardet.detect(bytes(data))['encoding']
+            if not encoding or encoding.lower() == 'ascii':
+                return 'cp1252'
+            return encoding
+        
+        # Feed the detector incrementally, stopping as soon as it is confident
+        detector = UniversalDetector()
+        for offset in range(0, len(data), cls.DETECTION_CHUNK_SIZE):
+            detector.feed(data[offset:offset + cls.DETECTION_CHUNK_SIZE])
+            if detector.done:
+                break
+        detector.close()
+        
+        return detector.result['encoding'] or 'utf-8'
     
-    def _load_docx(self, file_path: Path) -> str:
-        """Load Word document"""
+    @staticmethod
+    def _load_docx(file_path: Path) -> List[str]:
+        """Load Word document as one fragment per non-empty paragraph"""
         try:
-            doc = Document(str(file_path))
-            text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-            return text.strip()
+            paragraphs = []
+            # Stream paragraphs from the XML instead of building the full object model
+            with zipfile.ZipFile(file_path) as archive, archive.open('word/document.xml') as xml_file:
+                for _, element in etree.iterparse(xml_file, tag=f'{_W_NS}p'):
+                    text = ''.join(
+                        _RUN_CONTENT.get(node.tag, node.text or '')
+                        for run in element.iter(f'{_W_NS}r')
+                        for node in run
+                        if node.tag in _RUN_CONTENT or node.tag == f'{_W_NS}t'
+                    ).strip()
+                    if text:
+                        paragraphs.append(text)
+                    
+                    # Drop the finished paragraph and the ones before it so
+                    # memory stays bounded on large documents
+                    element.clear()
+                    while element.getprevious() is not None:
+                        del element.getparent()[0]
+            return paragraphs
         except Exception as e:
             logger.error(f"Error reading DOCX {file_path.name}: {str(e)}")
-            return ""
+            return []
     
     def get_document_stats(self, documents: List[Dict[str, str]]) -> Dict:
         """
@@ -139,16 +353,29 @@ class DocumentLoader:
         Returns:
             Statistics dictionary
         """
-        total_chars = sum(len(doc['content']) for doc in documents)
-        file_types = {}
+        total_chars = 0
+        file_types = Counter()
         
         for doc in documents:
-            file_type = doc['file_type']
-            file_types[file_type] = file_types.get(file_type, 0) + 1
+            total_chars += sum(len(fragment) for fragment in doc['fragments'])
+            file_types[doc['file_type']] += 1
         
         return {
             'total_documents': len(documents),
             'total_characters': total_chars,
-            'file_types': file_types,
+            'file_types': dict(file_types),
             'average_chars_per_doc': total_chars // len(documents) if documents else 0
         }
+
+
+def _load_document_task(file_path: Path, file_size: Optional[int] = None,
+                        encoding: Optional[str] = None) -> Optional[Dict[str, str]]:
+    """Load one document in a worker process, logging its outcome"""
+    try:
+        doc_data = DocumentLoader.load_single_document(file_path, file_size, encoding)
+        if doc_data:
+            logger.info(f"Loaded: {file_path.name}")
+        return doc_data
+    except Exception as e:
+        logger.error(f"Error loading {file_path.name}: {str(e)}")
+        return None
@@ -6,12 +6,15 @@ from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import logging
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 
-from app.config import settings
-from app.rag_pipeline import RAGPipeline
+from app.config import get_settings
+
+if TYPE_CHECKING:
+    from app.rag_pipeline import RAGPipeline
 
 # Configure logging
 logging.basicConfig(
@@ -41,7 +44,7 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
 # Initialize RAG pipeline (lazy loading)
-rag_pipeline: Optional[RAGPipeline] = None
+rag_pipeline: Optional["RAGPipeline"] = None
 
 
 # Pydantic models
@@ -77,10 +80,13 @@ class HealthResponse(BaseModel):
 
 
 # Helper function to get RAG pipeline
-def get_rag_pipeline() -> RAGPipeline:
+def get_rag_pipeline() -> "RAGPipeline":
     """Get or initialize RAG pipeline"""
     global rag_pipeline
     if rag_pipeline is None:
+        # Deferred so endpoints that never touch Azure skip the SDK imports
+        from app.rag_pipeline import RAGPipeline
+        
         logger.info("Initializing RAG pipeline...")
         rag_pipeline = RAGPipeline()
     return rag_pipeline
@@ -107,7 +113,7 @@ async def setup_index():
     """Initialize Azure AI Search index"""
     try:
         pipeline = get_rag_pipeline()
-        pipeline.create_search_index()
+        await run_in_threadpool(pipeline.create_search_index)
         
         return {
             "status": "success",
@@ -124,11 +130,9 @@ async def ingest_documents():
     try:
         pipeline = get_rag_pipeline()
         
-        # First create/update the index
-        pipeline.create_search_index()
-        
-        # Then ingest documents
-        pipeline.ingest_documents()
+        # Blocking Azure calls run in the threadpool to keep the event loop free;
+        # ingestion creates or updates the index itself
+        await run_in_threadpool(pipeline.ingest_documents)
         
         return {
             "status": "success",
@@ -147,7 +151,7 @@ async def query_documents(request: QueryRequest):
             raise HTTPException(status_code=400, detail="Question cannot be empty")
         
         pipeline = get_rag_pipeline()
-        result = pipeline.query(request.question)
+        result = await run_in_threadpool(pipeline.query, request.question)
         
         return {
             "answer": result['answer'],
@@ -164,6 +168,7 @@ async def query_documents(request: QueryRequest):
 @app.get("/api/config")
 async def get_config():
     """Get system configuration (non-sensitive data)"""
+    settings = get_settings()
     return {
         "document_path": settings.document_path,
         "chunk_size": settings.chunk_size,
@@ -177,6 +182,7 @@ async def get_config():
 @app.on_event("startup")
 async def startup_event():
     """Initialize application on startup"""
+    settings = get_settings()
     logger.info("Starting Enterprise RAG Document Q&A System")
     logger.info(f"Document path: {settings.document_path}")
     logger.info(f"Azure configured: {settings.validate_azure_config()}")
@@ -195,6 +201,7 @@ async def shutdown_event():
 if __name__ == "__main__":
     import uvicorn
     
+    settings = get_settings()
     uvicorn.run(
         "main:app",
         host=settings.app_host,
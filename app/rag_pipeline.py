@@ -4,38 +4,21 @@ Integrates Azure OpenAI, Azure AI Search, and LangChain
 """
 import os
 import logging
-from typing import List, Dict, Optional, Tuple
+import threading
+from typing import List, Dict, Iterator, Optional, Tuple
 import json
+from collections import OrderedDict
+from functools import lru_cache, cached_property
 
-# Azure imports
-from azure.search.documents.indexes import SearchIndexClient
-from azure.search.documents.indexes.models import (
-    SearchIndex,
-    SimpleField,
-    SearchableField,
-    SearchField,
-    SearchFieldDataType,
-    VectorSearch,
-    HnswAlgorithmConfiguration,
-    VectorSearchProfile,
-    SemanticConfiguration,
-    SemanticSearch,
-    SemanticPrioritizedFields,
-    SemanticField
-)
-from azure.core.credentials import AzureKeyCredential
-
-# LangChain imports
-from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores.azuresearch import AzureSearch
+# LangChain imports (Azure SDK and provider clients are imported lazily)
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.documents import Document
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
 
-from app.config import settings
+from app.config import get_settings
 from app.document_loader import DocumentLoader
+from utils.chunking import FastSplitter
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -44,12 +27,31 @@ logger = logging.getLogger(__name__)
 class RAGPipeline:
     """RAG Pipeline for document Q&A using LangChain"""
     
+    # Number of chunks embedded and uploaded per request to Azure
+    INDEX_BATCH_SIZE = 100
+    
     def __init__(self):
         """Initialize RAG pipeline with Azure services and LangChain"""
-        self.settings = settings
+        self.settings = get_settings()
+        
+        # Vector store will be initialized during ingestion
+        self.vector_store = None
+        self.qa_chain = None
+        self.retriever = None
         
-        # Initialize LangChain Azure OpenAI LLM
-        self.llm = AzureChatOpenAI(
+        # Cache answers to repeated questions, keyed by normalized text, in
+        # LRU order; failures are not cached
+        self._query_cache: "OrderedDict[str, Dict[str, any]]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        
+        logger.info("RAG Pipeline initialized with LangChain")
+    
+    @cached_property
+    def llm(self):
+        """LangChain Azure OpenAI LLM, created on first use"""
+        from langchain_openai import AzureChatOpenAI
+        
+        return AzureChatOpenAI(
             azure_endpoint=self.settings.azure_openai_endpoint,
             api_key=self.settings.azure_openai_api_key,
             api_version=self.settings.azure_openai_api_version,
@@ -57,59 +59,72 @@ class RAGPipeline:
             temperature=self.settings.temperature,
             max_tokens=self.settings.max_tokens
         )
-        
-        # Initialize LangChain Azure OpenAI Embeddings
-        self.embeddings = AzureOpenAIEmbeddings(
-            azure_endpoint=self.settings.azure_openai_endpoint,
-            api_key=self.settings.azure_openai_api_key,
-            api_version=self.settings.azure_openai_api_version,
-            deployment=self.settings.azure_openai_embedding_deployment
+    
+    @cached_property
+    def embeddings(self):
+        """LangChain Azure OpenAI Embeddings, shared across pipelines"""
+        return _cached_embeddings(*self._embeddings_config)
+    
+    @property
+    def _embeddings_config(self) -> Tuple[str, str, str, str]:
+        """Hashable key identifying the embeddings deployment"""
+        return (
+            self.settings.azure_openai_endpoint,
+            self.settings.azure_openai_api_key,
+            self.settings.azure_openai_api_version,
+            self.settings.azure_openai_embedding_deployment
         )
+    
+    @cached_property
+    def search_index_client(self):
+        """Azure Search client for index management, created on first use"""
+        from azure.core.credentials import AzureKeyCredential
+        from azure.search.documents.indexes import SearchIndexClient
         
-        # Initialize Azure Search clients (for index management)
-        self.search_index_client = SearchIndexClient(
+        return SearchIndexClient(
             endpoint=self.settings.azure_search_endpoint,
             credential=AzureKeyCredential(self.settings.azure_search_api_key)
         )
-        
-        # Initialize LangChain text splitter
-        self.text_splitter = RecursiveCharacterTextSplitter(
+    
+    @cached_property
+    def text_splitter(self):
+        """Regex-driven text splitter, created on first use"""
+        return FastSplitter(
             chunk_size=self.settings.chunk_size,
-            chunk_overlap=self.settings.chunk_overlap,
-            separators=["\n\n", "\n", " ", ""]
+            chunk_overlap=self.settings.chunk_overlap
+        )
+    
+    @cached_property
+    def document_loader(self) -> DocumentLoader:
+        """Document loader for the configured path, created on first use"""
+        return DocumentLoader(
+            self.settings.document_path,
+            encoding_cache_path=self.settings.encoding_cache_path
         )
-        
-        # Initialize document loader
-        self.document_loader = DocumentLoader(self.settings.document_path)
-        
-        # Vector store will be initialized during ingestion
-        self.vector_store = None
-        self.qa_chain = None
-        self.retriever = None
-        
-        logger.info("RAG Pipeline initialized with LangChain")
     
     def create_search_index(self):
-        """Create Azure AI Search index with vector search capabilities"""
+        """
+        Create Azure AI Search index with vector search capabilities
+        
+        An existing index whose fields cannot be updated in place (for
+        example a field that has become filterable) is dropped and
+        recreated; its documents are re-indexed by the next ingest.
+        """
+        from azure.core.exceptions import HttpResponseError
+        from azure.search.documents.indexes.models import (
+            SearchIndex,
+            VectorSearch,
+            HnswAlgorithmConfiguration,
+            VectorSearchProfile,
+            SemanticConfiguration,
+            SemanticSearch,
+            SemanticPrioritizedFields,
+            SemanticField
+        )
+        
         try:
             # Define the index schema
-            fields = [
-                SimpleField(name="id", type=SearchFieldDataType.String, key=True),
-                SearchableField(name="content", type=SearchFieldDataType.String),
-                SearchableField(name="metadata", type=SearchFieldDataType.String),  # LangChain metadata field
-                SearchableField(name="source", type=SearchFieldDataType.String, filterable=True),
-                SimpleField(name="file_path", type=SearchFieldDataType.String),
-                SimpleField(name="file_type", type=SearchFieldDataType.String, filterable=True),
-                SimpleField(name="chunk_id", type=SearchFieldDataType.String),
-                SimpleField(name="chunk_index", type=SearchFieldDataType.Int32),
-                SearchField(
-                    name="content_vector",
-                    type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
-                    searchable=True,
-                    vector_search_dimensions=1536,  # Ada-002 embedding size
-                    vector_search_profile_name="vector-profile"
-                )
-            ]
+            fields = self._build_index_fields()
             
             # Configure vector search
             vector_search = VectorSearch(
@@ -143,13 +158,51 @@ class RAGPipeline:
                 semantic_search=semantic_search
             )
             
-            result = self.search_index_client.create_or_update_index(index)
+            try:
+                result = self.search_index_client.create_or_update_index(index)
+            except HttpResponseError as e:
+                if not _is_schema_conflict(e):
+                    raise
+                logger.warning(f"Search index schema changed incompatibly, recreating: {e.message}")
+                self.search_index_client.delete_index(index.name)
+                self._clear_query_cache()
+                result = self.search_index_client.create_or_update_index(index)
             logger.info(f"Search index '{result.name}' created successfully")
             
         except Exception as e:
             logger.error(f"Error creating search index: {str(e)}")
             raise
     
+    @staticmethod
+    def _build_index_fields() -> list:
+        """Build the index schema fields"""
+        from azure.search.documents.indexes.models import (
+            SimpleField,
+            SearchableField,
+            SearchField,
+            SearchFieldDataType
+        )
+        
+        return [
+            SimpleField(name="id", type=SearchFieldDataType.String, key=True),
+            SearchableField(name="content", type=SearchFieldDataType.String),
+            SearchableField(name="metadata", type=SearchFieldDataType.String),  # LangChain metadata field
+            SearchableField(name="source", type=SearchFieldDataType.String, filterable=True),
+            SimpleField(name="file_path", type=SearchFieldDataType.String, filterable=True),
+            SimpleField(name="file_type", type=SearchFieldDataType.String, filterable=True),
+            SimpleField(name="file_hash", type=SearchFieldDataType.String, filterable=True),
+            SimpleField(name="chunk_id", type=SearchFieldDataType.String),
+            SimpleField(name="chunk_index", type=SearchFieldDataType.Int32),
+            SimpleField(name="chunk_count", type=SearchFieldDataType.Int32),
+            SearchField(
+                name="content_vector",
+                type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
+                searchable=True,
+                vector_search_dimensions=1536,  # Ada-002 embedding size
+                vector_search_profile_name="vector-profile"
+            )
+        ]
+    
     def delete_search_index(self):
         """Delete the Azure AI Search index"""
         try:
@@ -159,17 +212,28 @@ class RAGPipeline:
             logger.warning(f"Could not delete search index: {str(e)}")
     
     def ingest_documents(self):
-        """Load, chunk, embed, and index documents using LangChain"""
+        """
+        Load, chunk, embed, and index documents using LangChain
+        
+        Documents whose content hash is already present in the index are
+        skipped; changed documents have their previous chunks replaced, and
+        chunks of documents that were not loaded this time are removed.
+        """
         try:
-            # Recreate index to ensure it has correct schema
-            logger.info("Recreating search index with correct schema...")
-            self.delete_search_index()
+            # Create or update the index so it has the current schema
+            logger.info("Ensuring search index has the current schema...")
             self.create_search_index()
+            self.vector_store = self._get_vector_store()
             
             # Load documents
             logger.info("Loading documents...")
             documents = self.document_loader.load_all_documents()
             
+            # Keep the index in line with exactly the loaded documents, dropping
+            # files that were deleted, moved out of document_path or failed to load
+            if self._delete_unloaded_documents({doc['file_path'] for doc in documents}):
+                self._clear_query_cache()
+            
             if not documents:
                 logger.warning("No documents found to ingest")
                 return
@@ -178,44 +242,146 @@ class RAGPipeline:
             stats = self.document_loader.get_document_stats(documents)
             logger.info(f"Document stats: {stats}")
             
-            # Convert to LangChain Document format
-            langchain_docs = []
+            # Skip documents that are already indexed with identical content;
+            # key on the full path since file names repeat across folders
+            changed_docs = []
             for doc in documents:
-                langchain_docs.append(Document(
-                    page_content=doc['content'],
-                    metadata={
-                        'source': doc['source'],
-                        'file_path': doc['file_path'],
-                        'file_type': doc['file_type']
-                    }
-                ))
-            
-            # Split documents using LangChain text splitter
-            logger.info("Chunking documents with LangChain...")
-            chunks = self.text_splitter.split_documents(langchain_docs)
-            logger.info(f"Created {len(chunks)} chunks from {len(documents)} documents")
-            
-            # Initialize vector store with Azure Search
+                if self._is_indexed(doc['file_path'], doc['file_hash']):
+                    logger.info(f"Unchanged, skipping: {doc['file_path']}")
+                    continue
+                self._delete_indexed_chunks(doc['file_path'])
+                changed_docs.append(doc)
+            
+            if not changed_docs:
+                logger.info("All documents are up to date")
+                self._create_qa_chain()
+                return
+            
+            # Split each document's fragments directly into LangChain
+            # Documents without joining the whole document into one string;
+            # split_documents() would also deep-copy metadata for each chunk
+            logger.info("Chunking documents...")
+            chunks = []
+            for doc in changed_docs:
+                texts = [
+                    chunk_text
+                    for text in _group_fragments(doc['fragments'], self.settings.chunk_size)
+                    for chunk_text in self.text_splitter.split_text(text)
+                ]
+                # chunk_count lets a later ingest tell a complete upload from
+                # one interrupted partway
+                metadata = {
+                    'source': doc['source'],
+                    'file_path': doc['file_path'],
+                    'file_type': doc['file_type'],
+                    'file_hash': doc['file_hash'],
+                    'chunk_count': len(texts)
+                }
+                chunks.extend(Document(page_content=text, metadata=dict(metadata)) for text in texts)
+            logger.info(f"Created {len(chunks)} chunks from {len(changed_docs)} documents")
+            
+            # Group chunks with identical text (headers, footers, boilerplate)
+            # so each distinct text is embedded only once
+            groups: Dict[str, List[Document]] = {}
+            for chunk in chunks:
+                groups.setdefault(chunk.page_content, []).append(chunk)
+            unique_groups = list(groups.values())
+            logger.info(f"{len(unique_groups)} distinct chunk texts to embed")
+            
             logger.info("Indexing documents into Azure AI Search with LangChain...")
-            self.vector_store = AzureSearch(
-                azure_search_endpoint=self.settings.azure_search_endpoint,
-                azure_search_key=self.settings.azure_search_api_key,
-                index_name=self.settings.azure_search_index_name,
-                embedding_function=self.embeddings.embed_query
-            )
             
-            # Add documents to vector store
-            self.vector_store.add_documents(documents=chunks)
+            # Embed and upload in batches to bound memory use; duplicates are
+            # uploaded with their own metadata and the shared vector
+            indexed = 0
+            for i in range(0, len(unique_groups), self.INDEX_BATCH_SIZE):
+                batch = unique_groups[i:i + self.INDEX_BATCH_SIZE]
+                vectors = self.embeddings.embed_documents([group[0].page_content for group in batch])
+                
+                text_embeddings = []
+                metadatas = []
+                for group, vector in zip(batch, vectors):
+                    for chunk in group:
+                        text_embeddings.append((chunk.page_content, vector))
+                        metadatas.append(chunk.metadata)
+                
+                self.vector_store.add_embeddings(text_embeddings, metadatas=metadatas)
+                indexed += len(text_embeddings)
+                logger.info(f"Indexed {indexed}/{len(chunks)} chunks")
             
             # Create QA chain
             self._create_qa_chain()
             
-            logger.info(f"Successfully ingested {len(documents)} documents ({len(chunks)} chunks)")
+            # Cached answers may reference the previous index contents
+            self._clear_query_cache()
+            
+            logger.info(f"Successfully ingested {len(changed_docs)} documents ({len(chunks)} chunks)")
             
         except Exception as e:
             logger.error(f"Error ingesting documents: {str(e)}", exc_info=True)
             raise
     
+    def _is_indexed(self, file_path: str, file_hash: str) -> bool:
+        """Check whether all chunks for this exact file content are indexed"""
+        results = self.vector_store.client.search(
+            search_text="*",
+            filter=f"file_path eq {_odata_string(file_path)} and file_hash eq {_odata_string(file_hash)}",
+            select=["chunk_count"],
+            include_total_count=True,
+            top=1
+        )
+        first = next(iter(results), None)
+        
+        # A failed ingest can leave only some chunks behind; re-index those
+        return first is not None and first["chunk_count"] == results.get_count()
+    
+    def _delete_indexed_chunks(self, file_path: str):
+        """Remove previously indexed chunks for a document"""
+        results = self.vector_store.client.search(
+            search_text="*",
+            filter=f"file_path eq {_odata_string(file_path)}",
+            select=["id"]
+        )
+        stale = [{"id": result["id"]} for result in results]
+        if stale:
+            self.vector_store.client.delete_documents(documents=stale)
+            logger.info(f"Removed {len(stale)} stale chunks for {file_path}")
+    
+    def _delete_unloaded_documents(self, file_paths: set) -> int:
+        """
+        Remove indexed chunks of documents that are not among the loaded ones
+        
+        Args:
+            file_paths: Paths of the documents loaded for this ingest
+            
+        Returns:
+            Number of chunks removed
+        """
+        results = self.vector_store.client.search(
+            search_text="*",
+            select=["id", "file_path"]
+        )
+        
+        stale = []
+        removed = set()
+        for result in results:
+            if result["file_path"] not in file_paths:
+                stale.append({"id": result["id"]})
+                removed.add(result["file_path"])
+        
+        if stale:
+            self.vector_store.client.delete_documents(documents=stale)
+            logger.info(f"Removed {len(stale)} chunks of documents no longer loaded: {sorted(map(str, removed))}")
+        return len(stale)
+    
+    def _get_vector_store(self):
+        """Get the LangChain Azure Search vector store, shared across pipelines"""
+        return _cached_vector_store(
+            self.settings.azure_search_endpoint,
+            self.settings.azure_search_api_key,
+            self.settings.azure_search_index_name,
+            self._embeddings_config
+        )
+    
     def _create_qa_chain(self):
         """Create LangChain QA chain with custom prompt"""
         try:
@@ -258,12 +424,7 @@ Provide a clear, detailed answer based on the context. Always cite the sources y
         """Initialize vector store for querying (when not ingesting)"""
         try:
             if self.vector_store is None:
-                self.vector_store = AzureSearch(
-                    azure_search_endpoint=self.settings.azure_search_endpoint,
-                    azure_search_key=self.settings.azure_search_api_key,
-                    index_name=self.settings.azure_search_index_name,
-                    embedding_function=self.embeddings.embed_query
-                )
+                self.vector_store = self._get_vector_store()
                 self._create_qa_chain()
         except Exception as e:
             logger.error(f"Error initializing vector store: {str(e)}", exc_info=True)
@@ -273,6 +434,10 @@ Provide a clear, detailed answer based on the context. Always cite the sources y
         """
         Complete RAG query pipeline using LangChain
         
+        Repeated questions are served from an in-memory LRU cache keyed on
+        the normalized question text; retrieval and generation always see
+        the question as asked.
+        
         Args:
             question: User question
             
@@ -281,33 +446,17 @@ Provide a clear, detailed answer based on the context. Always cite the sources y
         """
         try:
             logger.info(f"Processing query: {question}")
+            key = question.strip().lower()
             
-            # Initialize vector store if not already done
-            self._init_vector_store_for_query()
+            with self._query_cache_lock:
+                cached = self._query_cache.get(key)
+                if cached is not None:
+                    self._query_cache.move_to_end(key)
+                    return dict(cached)
             
-            # Get relevant documents directly from vector store using hybrid search
-            source_documents = self.vector_store.similarity_search(
-                query=question, 
-                k=self.settings.top_k_results,
-                search_type="hybrid"
-            )
-            
-            # Run the QA chain
-            answer = self.qa_chain.invoke(question)
-            
-            # Extract unique sources from metadata
-            sources = list(set([
-                doc.metadata.get('source', 'Unknown') 
-                for doc in source_documents
-            ]))
-            
-            logger.info(f"Query processed successfully with {len(source_documents)} source chunks")
-            
-            return {
-                'answer': answer,
-                'sources': sources,
-                'context_chunks': len(source_documents)
-            }
+            result = self._run_query(question)
+            self._store_query_result(key, result)
+            return dict(result)
             
         except Exception as e:
             logger.error(f"Error processing query: {str(e)}", exc_info=True)
@@ -316,3 +465,112 @@ Provide a clear, detailed answer based on the context. Always cite the sources y
                 'sources': [],
                 'context_chunks': 0
             }
+    
+    def _store_query_result(self, key: str, result: Dict[str, any]):
+        """Add a query result to the LRU cache, evicting the oldest entries"""
+        max_size = self.settings.query_cache_size
+        if max_size <= 0:
+            return
+        
+        with self._query_cache_lock:
+            self._query_cache[key] = result
+            self._query_cache.move_to_end(key)
+            while len(self._query_cache) > max_size:
+                self._query_cache.popitem(last=False)
+    
+    def _clear_query_cache(self):
+        """Drop all cached query results"""
+        with self._query_cache_lock:
+            self._query_cache.clear()
+    
+    def _run_query(self, question: str) -> Dict[str, any]:
+        """Run retrieval and generation for a question"""
+        # Initialize vector store if not already done
+        self._init_vector_store_for_query()
+        
+        # Get relevant documents directly from vector store using hybrid search
+        source_documents = self.vector_store.similarity_search(
+            query=question, 
+            k=self.settings.top_k_results,
+            search_type="hybrid"
+        )
+        
+        # Run the QA chain
+        answer = self.qa_chain.invoke(question)
+        
+        # Extract unique sources from metadata
+        sources = list(set([
+            doc.metadata.get('source', 'Unknown') 
+            for doc in source_documents
+        ]))
+        
+        logger.info(f"Query processed successfully with {len(source_documents)} source chunks")
+        
+        return {
+            'answer': answer,
+            'sources': sources,
+            'context_chunks': len(source_documents)
+        }
+
+
+def _group_fragments(fragments: List[str], min_size: int) -> Iterator[str]:
+    """
+    Join consecutive fragments into pieces of at least min_size characters
+    
+    Keeps short fragments such as DOCX paragraphs from each becoming a
+    chunk on their own, while long fragments such as PDF pages pass through.
+    """
+    group = []
+    group_size = 0
+    for fragment in fragments:
+        group.append(fragment)
+        group_size += len(fragment) + 1
+        if group_size >= min_size:
+            yield "\n".join(group)
+            group = []
+            group_size = 0
+    if group:
+        yield "\n".join(group)
+
+
+@lru_cache(maxsize=4)
+def _cached_embeddings(endpoint: str, api_key: str, api_version: str, deployment: str):
+    """Create Azure OpenAI embeddings once per deployment"""
+    from langchain_openai import AzureOpenAIEmbeddings
+    
+    return AzureOpenAIEmbeddings(
+        azure_endpoint=endpoint,
+        api_key=api_key,
+        api_version=api_version,
+        deployment=deployment
+    )
+
+
+@lru_cache(maxsize=4)
+def _cached_vector_store(endpoint: str, api_key: str, index_name: str,
+                         embeddings_config: Tuple[str, str, str, str]):
+    """
+    Create the Azure Search vector store once per index
+    
+    Embeddings are looked up from their own cache by config so the key
+    stays hashable.
+    """
+    from langchain_community.vectorstores.azuresearch import AzureSearch
+    
+    return AzureSearch(
+        azure_search_endpoint=endpoint,
+        azure_search_key=api_key,
+        index_name=index_name,
+        embedding_function=_cached_embeddings(*embeddings_config),
+        fields=RAGPipeline._build_index_fields()
+    )
+
+
+def _is_schema_conflict(error) -> bool:
+    """Whether Azure rejected an index update because a field cannot change"""
+    return error.status_code == 400 and "cannot be changed" in str(error.message).lower()
+
+
+def _odata_string(value: str) -> str:
+    """Quote a value as an OData string literal for search filters"""
+    return "'" + value.replace("'", "''") + "'"
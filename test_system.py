@@ -7,9 +7,11 @@ import os
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.config import settings
+from app.config import get_settings
 from app.document_loader import DocumentLoader
-from utils.chunking import TextChunker
+from utils.chunking import FastSplitter, TextChunker, chunk_id_str
+
+settings = get_settings()
 
 
 def test_document_loading():
@@ -37,7 +39,8 @@ def test_document_loading():
             print(f"  Source: {sample['source']}")
             print(f"  Type: {sample['file_type']}")
             print(f"  Size: {sample['file_size']} bytes")
-            print(f"  Content preview: {sample['content'][:200]}...")
+            print(f"  Fragments: {len(sample['fragments'])}")
+            print(f"  Content preview: {sample['fragments'][0][:200]}...")
         
         return True
         
@@ -78,7 +81,7 @@ def test_chunking():
             print(f"\nSample Chunk:")
             sample_chunk = chunks[0]
             print(f"  Source: {sample_chunk['source']}")
-            print(f"  Chunk ID: {sample_chunk['chunk_id']}")
+            print(f"  Chunk ID: {chunk_id_str(sample_chunk)}")
             print(f"  Index: {sample_chunk['chunk_index']} / {sample_chunk['total_chunks']}")
             print(f"  Content preview: {sample_chunk['content'][:200]}...")
         
@@ -89,6 +92,33 @@ def test_chunking():
         return False
 
 
+def test_splitter():
+    """Test that the splitter does not repeat short leading sections"""
+    print("\n" + "=" * 60)
+    print("Testing Text Splitter")
+    print("=" * 60)
+    
+    splitter = FastSplitter(chunk_size=1000, chunk_overlap=200)
+    body = " ".join(["w"] * 3000)
+    cases = {
+        "heading": "Section heading one\n\n" + body,
+        "short lines": "First line\nSecond line\nThird line\n\n" + body
+    }
+    
+    passed = True
+    for name, text in cases.items():
+        chunks = splitter.split_text(text)
+        heading = text.split("\n\n")[0]
+        # Only the first chunk may be the short heading; the next must be full
+        if chunks[0] != heading or len(chunks[1]) < splitter.chunk_size // 2:
+            print(f"❌ {name}: unexpected chunks {[len(chunk) for chunk in chunks[:5]]}")
+            passed = False
+        else:
+            print(f"✅ {name}: {len(chunks)} chunks")
+    
+    return passed
+
+
 def test_configuration():
     """Test configuration loading"""
     print("\n" + "=" * 60)
@@ -117,7 +147,8 @@ def main():
     results = {
         "Configuration": test_configuration(),
         "Document Loading": test_document_loading(),
-        "Document Chunking": test_chunking()
+        "Document Chunking": test_chunking(),
+        "Text Splitter": test_splitter()
     }
     
     print("\n" + "=" * 60)
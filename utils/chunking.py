@@ -2,13 +2,83 @@
 Text Chunking Utilities
 Implements various chunking strategies for RAG
 """
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator, Tuple, Union
+from bisect import bisect_right
+from dataclasses import dataclass, field
 import re
 import logging
 
+import numpy as np
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Whitespace clean-up patterns used by TextChunker._clean_text
+_MULTI_BLANK = re.compile(r'\n\s*\n\s*\n+')
+_MULTI_SPACE = re.compile(r'  +')
+
+# Sentence endings TextChunker prefers to break after: '.' followed by a
+# space or newline, or '!'/'?' followed by a space
+_PERIOD, _EXCLAMATION, _QUESTION = ord('.'), ord('!'), ord('?')
+_SPACE, _NEWLINE = ord(' '), ord('\n')
+
+
+@dataclass(eq=False)
+class ChunkBatch:
+    """
+    Chunks stored as one column per field rather than one dict per chunk
+    
+    Metadata shared by every chunk of a document (source, file_path,
+    file_type, total_chunks) is stored once per document in the documents
+    table and reached through document_indices.
+    
+    Indexing a batch (batch[i]) returns the chunk as a dictionary with the
+    same keys TextChunker.iter_chunk_documents yields; slicing returns a
+    list of such dictionaries, as chunk_documents used to.
+    """
+    contents: List[str] = field(default_factory=list)
+    chunk_indices: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int32))
+    document_indices: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int32))
+    documents: List[Dict] = field(default_factory=list)
+    
+    def __len__(self) -> int:
+        return len(self.contents)
+    
+    def __getitem__(self, i: Union[int, slice]) -> Union[Dict, List[Dict]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        
+        chunk_index = int(self.chunk_indices[i])
+        document_index = int(self.document_indices[i])
+        doc = self.documents[document_index]
+        return {
+            'content': self.contents[i],
+            'source': doc['source'],
+            'file_path': doc['file_path'],
+            'file_type': doc['file_type'],
+            'chunk_id': (doc['source'], chunk_index),
+            'chunk_index': chunk_index,
+            'total_chunks': doc['total_chunks'],
+            'document_index': document_index
+        }
+
+
+def chunk_id_str(chunk: Dict) -> str:
+    """
+    Format a chunk's ID as a string
+    
+    Chunk dictionaries store chunk_id as a (source, chunk_index) tuple so no
+    string is built per chunk unless it is needed.
+    
+    Args:
+        chunk: Chunk dictionary from TextChunker
+        
+    Returns:
+        ID in the form "<source>_chunk_<index>"
+    """
+    source, chunk_index = chunk['chunk_id']
+    return f"{source}_chunk_{chunk_index}"
+
 
 class TextChunker:
     """Chunk documents for vector indexing"""
@@ -24,7 +94,7 @@ class TextChunker:
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
     
-    def chunk_documents(self, documents: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    def chunk_documents(self, documents: List[Dict[str, str]]) -> 'ChunkBatch':
         """
         Chunk all documents
         
@@ -32,28 +102,62 @@ class TextChunker:
             documents: List of document dictionaries
             
         Returns:
-            List of chunk dictionaries with metadata
+            ChunkBatch holding chunk contents and metadata column by column
         """
-        all_chunks = []
+        contents = []
+        chunk_indices = []
+        document_indices = []
+        document_table = []
         
         for doc_idx, doc in enumerate(documents):
-            chunks = self.chunk_text(doc['content'])
+            chunks = self.chunk_text('\n'.join(doc['fragments']))
+            count = len(chunks)
+            
+            contents.extend(chunks)
+            chunk_indices.extend(range(count))
+            document_indices.extend([doc_idx] * count)
+            document_table.append({
+                'source': doc['source'],
+                'file_path': doc['file_path'],
+                'file_type': doc['file_type'],
+                'total_chunks': count
+            })
+        
+        batch = ChunkBatch(
+            contents=contents,
+            chunk_indices=np.array(chunk_indices, dtype=np.int32),
+            document_indices=np.array(document_indices, dtype=np.int32),
+            documents=document_table
+        )
+        
+        logger.info(f"Created {len(batch)} chunks from {len(documents)} documents")
+        return batch
+    
+    def iter_chunk_documents(self, documents: Iterable[Dict[str, str]]) -> Iterator[Dict[str, str]]:
+        """
+        Lazily chunk documents, one document at a time
+        
+        Args:
+            documents: Iterable of document dictionaries
+            
+        Yields:
+            Chunk dictionaries with metadata
+        """
+        for doc_idx, doc in enumerate(documents):
+            # Only one document's chunks are held at once, for total_chunks
+            chunks = self.chunk_text('\n'.join(doc['fragments']))
             
             for chunk_idx, chunk in enumerate(chunks):
-                chunk_data = {
+                yield {
                     'content': chunk,
                     'source': doc['source'],
                     'file_path': doc['file_path'],
                     'file_type': doc['file_type'],
-                    'chunk_id': f"{doc['source']}_chunk_{chunk_idx}",
+                    'chunk_id': (doc['source'], chunk_idx),
                     'chunk_index': chunk_idx,
                     'total_chunks': len(chunks),
                     'document_index': doc_idx
                 }
-                all_chunks.append(chunk_data)
-        
-        logger.info(f"Created {len(all_chunks)} chunks from {len(documents)} documents")
-        return all_chunks
     
     def chunk_text(self, text: str) -> List[str]:
         """
@@ -65,17 +169,29 @@ class TextChunker:
         Returns:
             List of text chunks
         """
+        return list(self.iter_chunks(text))
+    
+    def iter_chunks(self, text: str) -> Iterator[str]:
+        """
+        Lazily chunk text using sliding window approach
+        
+        Args:
+            text: Text to chunk
+            
+        Yields:
+            Text chunks
+        """
         if not text:
-            return []
+            return
         
-        # Clean the text
-        text = self._clean_text(text)
+        # Clean the text and index its sentence endings in one step
+        text, sentence_ends = self._clean_and_index(text)
         
         # If text is smaller than chunk size, return as is
         if len(text) <= self.chunk_size:
-            return [text]
+            yield text
+            return
         
-        chunks = []
         start = 0
         
         while start < len(text):
@@ -84,26 +200,39 @@ class TextChunker:
             
             # Try to break at sentence boundary
             if end < len(text):
-                # Look for sentence endings near the chunk boundary
-                chunk_text = text[start:end]
-                last_period = max(
-                    chunk_text.rfind('. '),
-                    chunk_text.rfind('.\n'),
-                    chunk_text.rfind('! '),
-                    chunk_text.rfind('? ')
-                )
-                
-                if last_period > self.chunk_size * 0.5:  # Don't break too early
-                    end = start + last_period + 1
+                # Last sentence ending whose two-character marker fits in the window
+                idx = bisect_right(sentence_ends, end - 2) - 1
+                if idx >= 0:
+                    last_period = sentence_ends[idx] - start
+                    if last_period > self.chunk_size * 0.5:  # Don't break too early
+                        end = start + last_period + 1
             
             chunk = text[start:end].strip()
             if chunk:
-                chunks.append(chunk)
+                yield chunk
             
             # Move start position with overlap
             start = end - self.chunk_overlap if end < len(text) else end
+    
+    def _clean_and_index(self, text: str) -> Tuple[str, List[int]]:
+        """
+        Clean text and record where its sentences end
         
-        return chunks
+        Args:
+            text: Text to clean
+            
+        Returns:
+            Cleaned text and the sorted offsets of sentence-ending punctuation
+        """
+        text = self._clean_text(text)
+        
+        # UTF-32 gives one code point per element, so offsets match str indices
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+        current, following = codes[:-1], codes[1:]
+        is_space = following == _SPACE
+        ends = (((current == _PERIOD) & (is_space | (following == _NEWLINE)))
+                | (((current == _EXCLAMATION) | (current == _QUESTION)) & is_space))
+        return text, np.flatnonzero(ends).tolist()
     
     def _clean_text(self, text: str) -> str:
         """
@@ -116,14 +245,15 @@ class TextChunker:
             Cleaned text
         """
         # Replace multiple newlines with double newline
-        text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
+        text = _MULTI_BLANK.sub('\n\n', text)
         
-        # Replace multiple spaces with single space
-        text = re.sub(r' +', ' ', text)
+        # Replace multiple spaces with single space, skipping the regex
+        # entirely when there are no runs to collapse
+        if '  ' in text:
+            text = _MULTI_SPACE.sub(' ', text)
         
         # Remove leading/trailing whitespace from lines
-        lines = [line.strip() for line in text.split('\n')]
-        text = '\n'.join(lines)
+        text = '\n'.join(line.strip() for line in text.splitlines())
         
         return text.strip()
     
@@ -141,36 +271,140 @@ class TextChunker:
         if section_headers is None:
             section_headers = ['#', '##', '###']
         
+        # One alternation of all header prefixes, matched once per line; with
+        # no headers the whole text is a single section
+        header_re = None
+        if section_headers:
+            header_re = re.compile(r'\s*(?:' + '|'.join(re.escape(p) for p in section_headers) + ')')
+        
         sections = []
-        current_section = ""
+        current_lines: List[str] = []
         current_header = "Introduction"
         
         for line in text.split('\n'):
-            # Check if line is a header
-            is_header = False
-            for header_pattern in section_headers:
-                if line.strip().startswith(header_pattern):
-                    # Save previous section
-                    if current_section.strip():
-                        sections.append({
-                            'content': current_section.strip(),
-                            'header': current_header
-                        })
-                    
-                    # Start new section
-                    current_header = line.strip()
-                    current_section = ""
-                    is_header = True
-                    break
-            
-            if not is_header:
-                current_section += line + "\n"
+            if header_re and header_re.match(line):
+                # Save previous section
+                content = '\n'.join(current_lines).strip()
+                if content:
+                    sections.append({
+                        'content': content,
+                        'header': current_header
+                    })
+                
+                # Start new section
+                current_header = line.strip()
+                current_lines.clear()
+            else:
+                current_lines.append(line)
         
         # Add last section
-        if current_section.strip():
+        content = '\n'.join(current_lines).strip()
+        if content:
             sections.append({
-                'content': current_section.strip(),
+                'content': content,
                 'header': current_header
             })
         
         return sections
+
+
+class FastSplitter:
+    """
+    Split text on paragraph, line and word boundaries
+    
+    Follows the RecursiveCharacterTextSplitter contract used by the RAG
+    pipeline: chunks are at most chunk_size characters and break at the
+    largest separator available in the window. Overlap is made of whole
+    pieces of the kind the previous chunk broke at, so a paragraph break
+    only carries trailing paragraphs that fit in chunk_overlap. Each chunk
+    only searches its own window instead of scanning the whole text.
+    """
+    
+    # Separators in order of preference: paragraph, line, word
+    SEPARATORS = ('\n\n', '\n', ' ')
+    
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+        """
+        Initialize fast splitter
+        
+        Args:
+            chunk_size: Maximum size of each chunk in characters
+            chunk_overlap: Maximum number of overlapping characters between chunks
+        """
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+    
+    def split_text(self, text: str) -> List[str]:
+        """
+        Split text into chunks
+        
+        Args:
+            text: Text to split
+            
+        Returns:
+            List of text chunks
+        """
+        chunks = []
+        start = 0
+        floor = 0  # Where the separator the previous chunk broke at ends
+        length = len(text)
+        
+        while start < length:
+            limit = start + self.chunk_size
+            
+            if limit >= length:
+                # Skip the tail if only the overlap is left, which would
+                # repeat the previous chunk
+                chunk = text[start:].strip()
+                if chunk and text[floor:].strip():
+                    chunks.append(chunk)
+                break
+            
+            # A break must leave new text past the previous one, otherwise the
+            # overlap finds the same break again and yields shrinking duplicates
+            while floor < limit and text[floor].isspace():
+                floor += 1
+            
+            # Break before the last preferred separator inside the window
+            split = limit
+            separator = ''
+            for candidate in self.SEPARATORS:
+                position = text.rfind(candidate, floor, limit)
+                if position > floor:
+                    split = position
+                    separator = candidate
+                    break
+            
+            chunk = text[start:split].strip()
+            if chunk:
+                chunks.append(chunk)
+            floor = split + len(separator)
+            
+            # Start the next chunk after the first separator of the same kind
+            # in the overlap window; hard splits overlap at a word boundary
+            overlap_from = max(split - self.chunk_overlap, start + 1)
+            position = text.find(separator or ' ', overlap_from, split)
+            if position != -1:
+                start = position + len(separator or ' ')
+            else:
+                start = floor
+        
+        return chunks
+    
+    def split_documents(self, documents: list) -> list:
+        """
+        Split LangChain documents, copying metadata onto each chunk
+        
+        Args:
+            documents: LangChain Document objects
+            
+        Returns:
+            List of chunk Document objects
+        """
+        from langchain_core.documents import Document
+        
+        return [
+            Document(page_content=chunk, metadata=dict(doc.metadata))
+            for doc in documents
+            for chunk in self.split_text(doc.page_content)
+        ]
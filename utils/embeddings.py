@@ -2,10 +2,20 @@
 Embedding Utilities
 Helper functions for working with embeddings
 """
+import hashlib
 import numpy as np
-from typing import List
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Union
 import logging
 
+# SimSIMD provides SIMD cosine kernels; NumPy is the fallback
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -21,43 +31,120 @@ def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
     Returns:
         Cosine similarity score
     """
-    vec1_np = np.array(vec1)
-    vec2_np = np.array(vec2)
+    vec1_np = np.ascontiguousarray(vec1, dtype=np.float32)
+    vec2_np = np.ascontiguousarray(vec2, dtype=np.float32)
+    
+    if simsimd is not None:
+        if not vec1_np.any() or not vec2_np.any():
+            return 0.0
+        return 1.0 - float(simsimd.cosine(vec1_np, vec2_np))
     
-    dot_product = np.dot(vec1_np, vec2_np)
-    magnitude1 = np.linalg.norm(vec1_np)
-    magnitude2 = np.linalg.norm(vec2_np)
+    # Squared magnitudes via vdot; a single sqrt of their product follows
+    squared1 = np.vdot(vec1_np, vec1_np)
+    squared2 = np.vdot(vec2_np, vec2_np)
     
-    if magnitude1 == 0 or magnitude2 == 0:
+    if squared1 == 0 or squared2 == 0:
         return 0.0
     
-    return dot_product / (magnitude1 * magnitude2)
+    return float(np.dot(vec1_np, vec2_np) / np.sqrt(squared1 * squared2))
 
 
-def batch_embeddings(texts: List[str], embedding_function, batch_size: int = 10) -> List[List[float]]:
+def batch_embeddings(texts: Iterable[str], embedding_function, batch_size: int = 10,
+                     max_workers: int = 4,
+                     cache: Optional[Dict[bytes, List[float]]] = None) -> List[List[float]]:
     """
     Generate embeddings in batches
     
+    Batches are embedded concurrently on a thread pool, since embedding
+    calls mostly wait on I/O; results are returned in input order. Texts
+    are keyed by content hash so each distinct text is embedded only once.
+    
     Args:
-        texts: List of texts to embed
-        embedding_function: Function to generate embeddings
+        texts: Texts to embed; may be a lazy iterator such as
+            TextChunker.iter_chunks
+        embedding_function: Function taking a list of texts and returning
+            one vector per text, e.g. Embeddings.embed_documents; wrap
+            single-text functions with make_batched
         batch_size: Batch size for processing
+        max_workers: Number of batches embedded concurrently
+        cache: Optional mapping of content hash to vector, reused across
+            calls; a fresh one is used per call if omitted
         
     Returns:
         List of embedding vectors
     """
+    if cache is None:
+        cache = {}
+    
     embeddings = []
+    texts = iter(texts)
+    batch_number = 0
+    scheduled = set()
+    
+    def collect(keys, miss_keys, future):
+        nonlocal batch_number
+        if future is not None:
+            for key, vector in zip(miss_keys, future.result()):
+                cache[key] = vector
+                scheduled.discard(key)
+        # Earlier batches are collected first, so every key is cached by now
+        embeddings.extend(cache[key] for key in keys)
+        batch_number += 1
+        logger.info(f"Generated embeddings for batch {batch_number} "
+                    f"({len(miss_keys)} new of {len(keys)})")
     
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i + batch_size]
-        batch_embeddings = [embedding_function(text) for text in batch]
-        embeddings.extend(batch_embeddings)
-        logger.info(f"Generated embeddings for batch {i // batch_size + 1}")
+    # Bound the batches in flight so lazy input is not read all at once;
+    # batches are collected first-in first-out to keep input order
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            batch = list(islice(texts, batch_size))
+            if not batch:
+                break
+            
+            # Only send texts that are neither cached nor already in flight
+            keys = []
+            miss_keys = []
+            miss_texts = []
+            for text in batch:
+                key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+                keys.append(key)
+                if key not in cache and key not in scheduled:
+                    scheduled.add(key)
+                    miss_keys.append(key)
+                    miss_texts.append(text)
+            
+            future = executor.submit(embedding_function, miss_texts) if miss_texts else None
+            pending.append((keys, miss_keys, future))
+            if len(pending) >= 2 * max_workers:
+                collect(*pending.popleft())
+        
+        while pending:
+            collect(*pending.popleft())
     
     return embeddings
 
 
-def normalize_vector(vector: List[float]) -> List[float]:
+def make_batched(embedding_function: Callable[[str], List[float]],
+                 max_workers: int = 4) -> Callable[[List[str]], List[List[float]]]:
+    """
+    Adapt a single-text embedding function for batch_embeddings
+    
+    Args:
+        embedding_function: Function embedding one text per call
+        max_workers: Number of threads issuing calls concurrently
+        
+    Returns:
+        Function embedding a list of texts, preserving order
+    """
+    def embed_batch(texts: List[str]) -> List[List[float]]:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(embedding_function, texts))
+    
+    return embed_batch
+
+
+def normalize_vector(vector: Union[List[float], np.ndarray]) -> np.ndarray:
     """
     Normalize a vector to unit length
     
@@ -65,37 +152,115 @@ def normalize_vector(vector: List[float]) -> List[float]:
         vector: Input vector
         
     Returns:
-        Normalized vector
+        Normalized float32 vector
     """
-    vec_np = np.array(vector)
-    magnitude = np.linalg.norm(vec_np)
+    vec_np = np.ascontiguousarray(vector, dtype=np.float32)
+    magnitude = np.sqrt(np.vdot(vec_np, vec_np))
     
     if magnitude == 0:
-        return vector
+        return vec_np
     
-    return (vec_np / magnitude).tolist()
+    return vec_np * np.reciprocal(magnitude)
+
+
+def normalize_vector_list(vector: List[float]) -> List[float]:
+    """
+    Normalize a vector to unit length, returning a plain list
+    
+    Args:
+        vector: Input vector
+        
+    Returns:
+        Normalized vector as a list of floats
+    """
+    return normalize_vector(vector).tolist()
+
+
+def build_embedding_matrix(embeddings: List[List[float]],
+                           dtype: np.dtype = np.float32) -> np.ndarray:
+    """
+    Stack embeddings into a contiguous matrix with unit-length rows
+    
+    Build this once per corpus and pass it to find_top_k_similar with
+    normalized=True so each query costs a single matrix-vector product.
+    
+    Args:
+        embeddings: List of embedding vectors
+        dtype: Storage type; np.float16 halves memory and bandwidth at the
+            cost of quantization noise in the scores
+        
+    Returns:
+        Array of shape (N, D); all-zero rows are left as zeros
+    """
+    matrix = np.array(embeddings, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix.astype(dtype, copy=False)
+
+
+def _blockwise_matvec(matrix: np.ndarray, vector: np.ndarray,
+                      block_rows: int = 4096) -> np.ndarray:
+    """Multiply a reduced-precision matrix by a float32 vector block by block"""
+    # NumPy has no BLAS kernel for float16, so upcast bounded row blocks to
+    # float32 rather than the whole matrix
+    result = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), block_rows):
+        block = matrix[start:start + block_rows].astype(np.float32)
+        result[start:start + block_rows] = block @ vector
+    return result
 
 
 def find_top_k_similar(query_embedding: List[float], 
-                       embeddings: List[List[float]], 
-                       k: int = 5) -> List[int]:
+                       embeddings: Union[List[List[float]], np.ndarray], 
+                       k: int = 5,
+                       normalized: bool = False) -> List[int]:
     """
     Find top K most similar embeddings
     
     Args:
         query_embedding: Query vector
-        embeddings: List of embedding vectors
+        embeddings: List of embedding vectors, or a matrix from
+            build_embedding_matrix
         k: Number of results to return
+        normalized: Whether embeddings is already a matrix from
+            build_embedding_matrix
         
     Returns:
         Indices of top K similar embeddings
     """
-    similarities = [
-        cosine_similarity(query_embedding, emb) 
-        for emb in embeddings
-    ]
+    if len(embeddings) == 0:
+        return []
+    
+    # Contiguous float32 operands let BLAS run SGEMV without a hidden copy
+    matrix = np.ascontiguousarray(embeddings) if normalized else build_embedding_matrix(embeddings)
+    
+    query = np.ascontiguousarray(query_embedding, dtype=np.float32)
+    
+    if simsimd is not None:
+        # SimSIMD needs matching types and has native float16 kernels
+        query = query.astype(matrix.dtype, copy=False)
+        distances = np.asarray(simsimd.cdist(query[np.newaxis, :], matrix, metric='cosine'))
+        similarities = 1.0 - distances[0].astype(np.float32, copy=False)
+    else:
+        query_norm = np.linalg.norm(query)
+        if query_norm != 0:
+            query = query / query_norm
+        
+        # Rows are unit length, so cosine similarity reduces to one matrix-vector product
+        if matrix.dtype == np.float32:
+            similarities = matrix @ query
+        else:
+            similarities = _blockwise_matvec(matrix, query)
     
-    # Get indices of top K similarities
-    top_k_indices = np.argsort(similarities)[-k:][::-1]
+    # Select the top K in O(N), then sort only those K
+    k = min(k, len(similarities))
+    if k <= 0:
+        return []
+    if k < len(similarities):
+        candidates = np.argpartition(similarities, -k)[-k:]
+    else:
+        candidates = np.arange(len(similarities))
+    top_k_indices = candidates[np.argsort(-similarities[candidates])]
     
     return top_k_indices.tolist()